@@ -10,13 +10,17 @@ plt.show(block=True)
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--estimator', help='the estimator you want to use')
+parser.add_argument('--no-plot', action='store_true',
+                    help='run headless and skip the real-time plot')
 
-def spin(estimator):
+def spin(estimator, plot=True):
     """
     Parameters
     ----------
     estimator : Estimator
         The instance of the estimator
+    plot : bool
+        Whether to animate the estimation results after running
 
     Returns
     -------
@@ -25,6 +29,8 @@ def spin(estimator):
 
     # noinspection PyUnusedLocal
     estimator.run()
+    if not plot:
+        return
     anim = FuncAnimation(
         estimator.fig,
         estimator.plot_update,
@@ -42,20 +48,24 @@ def main():
     """
     args = parser.parse_args()
     estimator_type = args.estimator
+    enable_plot = not args.no_plot
     if estimator_type == 'oracle':
-        estimator = OracleObserver(is_noisy=True)
+        estimator = OracleObserver(
+            is_noisy=True, enable_plot=enable_plot)
     elif estimator_type == 'dr':
-        estimator = DeadReckoning(is_noisy=True)
+        estimator = DeadReckoning(
+            is_noisy=True, enable_plot=enable_plot)
     elif estimator_type == 'kf':
         raise RuntimeError(
             f'Estimator type: {estimator_type} is not supported for the quadrotor!')
     elif estimator_type == 'ekf':
-        estimator = ExtendedKalmanFilter(is_noisy=True)
+        estimator = ExtendedKalmanFilter(
+            is_noisy=True, enable_plot=enable_plot)
     else:
         raise RuntimeError(
             'Estimator type {} not supported'.format(estimator_type))
     print('Invoking estimator {}...'.format(estimator_type))
-    spin(estimator)
+    spin(estimator, enable_plot)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+
+from drone_estimator import \
+    DeadReckoning, ExtendedKalmanFilter, BatchedExtendedKalmanFilter
+
+
+@pytest.fixture(autouse=True)
+def data_dir(monkeypatch):
+    # The estimators load data.npy / noisy_data.npy from the working directory
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+
+def step_through_update(estimator):
+    estimator.x_hat[0] = estimator.x[0]
+    for t in range(1, len(estimator.x)):
+        estimator.update(t)
+    return estimator.x_hat
+
+
+def test_dead_reckoning_run_matches_update():
+    vectorized = DeadReckoning(is_noisy=True, enable_plot=False)
+    vectorized.run()
+    stepped = DeadReckoning(is_noisy=True, enable_plot=False)
+    step_through_update(stepped)
+
+    np.testing.assert_allclose(vectorized.x_hat, stepped.x_hat, rtol=0, atol=1e-10)
+
+
+def test_compiled_ekf_matches_update():
+    compiled = ExtendedKalmanFilter(is_noisy=True, enable_plot=False)
+    compiled._run_compiled()
+    stepped = ExtendedKalmanFilter(is_noisy=True, enable_plot=False)
+    step_through_update(stepped)
+
+    np.testing.assert_allclose(compiled.x_hat, stepped.x_hat, rtol=0, atol=1e-10)
+    np.testing.assert_allclose(compiled.P, stepped.P, rtol=1e-8, atol=1e-10)
+
+
+def test_ekf_run_uses_overridden_update():
+    class CountingFilter(ExtendedKalmanFilter):
+        calls = 0
+
+        def update(self, t):
+            CountingFilter.calls += 1
+            super().update(t)
+
+    estimator = CountingFilter(is_noisy=True, enable_plot=False)
+    estimator.run()
+
+    assert CountingFilter.calls >= len(estimator.x) - 1
+
+
+def test_batched_ekf_matches_single_filters():
+    Rs = [np.diag([10.0, 2.0]), np.diag([1000.0, 2.0])]
+    batched = BatchedExtendedKalmanFilter(R=np.array(Rs), is_noisy=True)
+    batched.run()
+
+    for k, R in enumerate(Rs):
+        single = ExtendedKalmanFilter(is_noisy=True, enable_plot=False)
+        single.R = R
+        single.run()
+        np.testing.assert_allclose(batched.x_hat[:, k], single.x_hat, rtol=0, atol=1e-10)